@@ -0,0 +1,83 @@
+"""
+Parser for the results osascript prints in source form (``-s s``).
+
+In source form strings are quoted and escaped, so a result which spans
+several lines can be told apart from the prompts of the interactive mode.
+Only literals are supported: strings, numbers, booleans, missing value,
+lists and records. Anything else raises ValueError.
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"', re.S)
+_ESCAPE = re.compile(r"\\(.)", re.S)
+_ESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:E[+-]?\d+)?")
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\|[^|]*\|")
+_WORDS = {"true": True, "false": False, "missing value": None}
+_SPACE = re.compile(r"\s*")
+
+
+def loads(text: str) -> Any:
+    """ parse a single AppleScript literal """
+    value, pos = _parse(text, 0)
+    if text[pos:].strip():
+        raise ValueError(f"unexpected {text[pos:pos + 20]!r} after the result")
+    return value
+
+
+def _skip(text: str, pos: int) -> int:
+    match = _SPACE.match(text, pos)
+    assert match
+    return match.end()
+
+
+def _parse(text: str, pos: int) -> Tuple[Any, int]:
+    """ parse the literal starting at pos, return it and the position after it """
+    pos = _skip(text, pos)
+    if pos >= len(text):
+        raise ValueError("unexpected end of the result")
+    if text[pos] == '"':
+        match = _STRING.match(text, pos)
+        if match is None:
+            raise ValueError("unterminated string in the result")
+        return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), match.group(1)), match.end()
+    if text[pos] == "{":
+        return _parse_braces(text, pos + 1)
+    match = _NUMBER.match(text, pos)
+    if match:
+        number = match.group()
+        return (float(number) if "." in number or "E" in number else int(number)), match.end()
+    for word, value in _WORDS.items():
+        end = pos + len(word)
+        if text.startswith(word, pos) and not text[end:end + 1].isalnum():
+            return value, end
+    raise ValueError(f"unsupported value {text[pos:pos + 20]!r} in the result")
+
+
+def _parse_braces(text: str, pos: int) -> Tuple[Any, int]:
+    """ parse a list or a record, pos is after the opening brace """
+    items: List[Any] = []
+    record: Dict[str, Any] = {}
+    pos = _skip(text, pos)
+    if text.startswith("}", pos):
+        return items, pos + 1
+    while True:
+        pos = _skip(text, pos)
+        match = _IDENTIFIER.match(text, pos)
+        colon = _skip(text, match.end()) if match else pos
+        if match and text.startswith(":", colon):
+            record[match.group().strip("|")], pos = _parse(text, colon + 1)
+        else:
+            value, pos = _parse(text, pos)
+            items.append(value)
+        pos = _skip(text, pos)
+        if text.startswith(",", pos):
+            pos += 1
+        elif text.startswith("}", pos):
+            break
+        else:
+            raise ValueError(f"expected , or }} at {text[pos:pos + 20]!r} in the result")
+    if record and items:
+        raise ValueError("list and record items mixed in the result")
+    return (record if record else items), pos + 1
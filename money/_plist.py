@@ -0,0 +1,122 @@
+"""
+A plist parser based on lxml.
+
+It builds the same objects as plistlib, but parses with the C parser of
+lxml and frees each element once it is converted. lxml is optional, if it
+is not installed, plistlib is used.
+"""
+import base64
+import datetime
+import io
+import plistlib
+from typing import IO, Any, Callable, Dict, Generator, Iterator, List, Optional, Union
+
+try:
+    from lxml import etree  # type: ignore
+except ImportError:  # lxml is optional
+    etree = None
+
+
+def _integer(text: str) -> int:
+    if text.startswith(("0x", "0X")):
+        return int(text, 16)
+    return int(text)
+
+
+def _date(text: str) -> datetime.datetime:
+    # plist dates are written as UTC in the form 2023-01-31T12:00:00Z, plistlib returns naive datetimes
+    return datetime.datetime.fromisoformat(text.rstrip("Z"))
+
+
+_SCALARS: Dict[str, Callable[[str], Any]] = {
+    "string": lambda text: text,
+    "integer": _integer,
+    "real": float,
+    "true": lambda text: True,
+    "false": lambda text: False,
+    "date": _date,
+    "data": base64.b64decode,
+}
+
+
+def load(fp: IO[bytes]) -> Any:
+    """ parse a XML plist from a binary file object """
+    if etree is None:
+        return plistlib.load(fp, fmt=plistlib.PlistFormat.FMT_XML)
+    parser = _parse(fp, None)
+    try:
+        while True:
+            next(parser)
+    except StopIteration as stop:
+        return stop.value
+
+
+def iterload(fp: IO[bytes], key: str) -> Iterator[Any]:
+    """ parse a XML plist whose top level is a dict and yield the items of the array stored under key
+
+    The items are yielded while the plist is parsed, the array is never built.
+    Everything else in the plist is skipped.
+    """
+    if etree is None:
+        yield from plistlib.load(fp, fmt=plistlib.PlistFormat.FMT_XML).get(key, [])
+        return
+    yield from _parse(fp, key)
+
+
+def _parse(fp: IO[bytes], stream_key: Optional[str]) -> Generator[Any, None, Any]:
+    """ parse the plist, items of the top level array stream_key are yielded, the plist is returned """
+    stack: List[Union[Dict[str, Any], List[Any]]] = []
+    keys: List[str] = []
+    result: Any = None
+
+    def add(value: Any) -> bool:
+        """ add a value to the current container, returns True if the value should be yielded instead """
+        nonlocal result
+        if not stack:
+            result = value
+        elif isinstance(stack[-1], dict):
+            stack[-1][keys[-1]] = value
+        elif len(stack) == 2 and stream_key is not None and keys[0] == stream_key:
+            return True
+        else:
+            stack[-1].append(value)
+        return False
+
+    try:
+        for event, elem in etree.iterparse(fp, events=("start", "end"), resolve_entities=False):
+            tag = elem.tag
+            if event == "start":
+                if tag == "dict":
+                    stack.append({})
+                    keys.append("")
+                elif tag == "array":
+                    stack.append([])
+                    keys.append("")
+                continue
+            value: Any = None
+            emit = False
+            if tag == "key":
+                keys[-1] = elem.text or ""
+            elif tag in ("dict", "array"):
+                keys.pop()
+                value = stack.pop()
+                emit = add(value)
+            elif tag in _SCALARS:
+                value = _SCALARS[tag](elem.text or "")
+                emit = add(value)
+            elif tag != "plist":
+                raise ValueError(f"unsupported plist element {tag!r}")
+            # drop the converted element and everything before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+            if emit:
+                yield value
+    except etree.XMLSyntaxError as exc:
+        raise ValueError(f"invalid plist: {exc}") from exc
+    return result
+
+
+def loads(data: bytes) -> Any:
+    """ parse a XML plist from bytes """
+    return load(io.BytesIO(data))
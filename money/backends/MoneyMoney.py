@@ -1,14 +1,119 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import concurrent.futures
+import contextlib
 import datetime
-import plistlib
+import functools
+import hashlib
+import io
+import itertools
+import os
 import json
 import re
-
-from typing import Iterable, Optional, List, Dict, Set, Any
-
-from .. import utils
+import threading
+import time
+
+from xml.parsers.expat import ExpatError
+
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, List, Dict, Set, FrozenSet, Tuple, Any, Callable
+
+from .. import _plist, utils
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # orjson is optional
+    orjson = None  # type: ignore
+
+try:
+    import re2 as re_impl  # type: ignore
+except ImportError:  # re2 is optional, the tag pattern works with both
+    re_impl = re
+
+
+# AppleScript commands, the app name and arguments are filled in with %-formatting in the order given
+# app
+_ACCOUNTS_CMD = 'tell application "%s" to export accounts'
+# app, account, start date, end date clause
+_TRANSACTIONS_CMD = 'tell application "%s" to export transactions from account "%s" from date "%s"%s as "plist"'
+# app, accounts, start date, end date clause, separator
+_TRANSACTIONS_BULK_CMD = """set res to ""
+tell application "%s"
+repeat with acc in {%s}
+set res to res & (export transactions from account (contents of acc) from date "%s"%s as "plist") & ¬
+(character id %d)
+end repeat
+end tell
+return res"""
+# end date
+_END_DATE_CLAUSE = ' to date "%s"'
+# app, account
+_PORTFOLIO_CMD = 'tell application "%s" to export portfolio from account "%s" as "plist"'
+# txid, name, value
+_SET_FIELD_STATEMENT = 'set transaction id %s %s to "%s"'
+# app, txid, name, value
+_SET_FIELD_CMD = 'tell application "%s" to ' + _SET_FIELD_STATEMENT
+# app, statements
+_SET_FIELDS_CMD = """tell application "%s"
+%s
+end tell"""
+
+
+# MoneyMoney exports missing dates as the start of the epoch
+_EPOCH_SENTINEL = datetime.date(year=1970, month=1, day=2)
+
+
+def start_date_from_age(age: int, start_date: Optional[datetime.date]) -> datetime.date:
+    """ helper function to compute the start of an export window """
+    if start_date is None:
+        start_date = datetime.date.today() - datetime.timedelta(days=age)
+    return start_date
+
+
+def transaction_filter(*, booked=None, checked=None, category=None) -> Callable[[Dict[str, Any]], bool]:
+    """ helper function to build a filter on exported transactions, see Transaction.pass_filter
+
+    Only the given criteria are checked, the returned function does not test
+    for unused arguments on every transaction.
+    """
+    checks = [(field, value) for field, value in (("booked", booked), ("checkmark", checked), ("category", category))
+              if value is not None]
+    if not checks:
+        return lambda data: True
+    if len(checks) == 1:
+        field, value = checks[0]
+        return lambda data: data.get(field) == value
+    return lambda data: all(data.get(field) == value for field, value in checks)
+
+
+def exported_value(name: str, value: str) -> Any:
+    """ helper function to convert a value set via AppleScript to the value an export would show """
+    if name == "checkmark":
+        return value == "on"
+    return value
+
+
+def env_seconds(name: str) -> float:
+    """ helper function to read a number of seconds from the environment, missing or malformed values are 0 """
+    try:
+        return max(float(os.environ.get(name) or 0), 0.0)
+    except ValueError:
+        return 0.0
+
+
+def escape_string(value: str) -> str:
+    """ helper function to escape a value for a quoted AppleScript string """
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+@functools.lru_cache(maxsize=32)
+def format_date(date: datetime.date) -> str:
+    """ helper function to format a date as dd/mm/yyyy for AppleScript, without going through strftime
+
+    The exports of all accounts use the same few dates, so the results are cached.
+    """
+    return f"{date.day:02d}/{date.month:02d}/{date.year:04d}"
 
 
 def serialize(obj) -> str:
@@ -18,8 +123,18 @@ def serialize(obj) -> str:
     return str(obj)
 
 
+def dumps(data: Any) -> str:
+    """ helper function to serialize data as compact json, uses orjson if it is installed """
+    if orjson is not None:
+        # datetimes are passed to serialize, so both variants write dates only
+        option = orjson.OPT_PASSTHROUGH_DATETIME  # pylint: disable=no-member
+        return orjson.dumps(data, default=serialize, option=option).decode("utf-8")  # pylint: disable=no-member
+    # orjson writes UTF-8, so non ASCII characters are not escaped here either
+    return json.dumps(data, separators=(",", ":"), default=serialize, ensure_ascii=False)
+
+
 class Comment:
-    TAG_REGEX = re.compile(r"\s*<tag:(?P<tag>[^>]+)>\s*")
+    TAG_REGEX = re_impl.compile(r"\s*<tag:([^>]+)>\s*")
 
     def __init__(self, s: Optional[str]):
         self.text = ""
@@ -29,8 +144,15 @@ class Comment:
 
     def parse(self, s: str) -> None:
         """ parse a comment into the text part and a list of tags """
-        self.tags = set(m.group("tag") for m in self.TAG_REGEX.finditer(s))
-        self.text = self.TAG_REGEX.sub("", s).strip()
+        tags: Set[str] = set()
+
+        def collect(m: re.Match) -> str:
+            tags.add(m.group(1))
+            return ""
+
+        # one scan removes the tags from the text and collects them
+        self.text = self.TAG_REGEX.sub(collect, s).strip()
+        self.tags = tags
 
     def add(self, tag: str) -> None:
         """ add a tag """
@@ -45,47 +167,99 @@ class Comment:
             self.tags.remove(tag)
 
     def __str__(self) -> str:
-        res = []
-        res.append(self.text.strip())
-        for tag in self.tags:
-            res.append(f"<tag:{tag}>")
-        return (" ".join(res)).strip()
+        # tags are sorted, so the same tags always give the same comment
+        text = self.text.strip()
+        return " ".join(itertools.chain((text,) if text else (), (f"<tag:{tag}>" for tag in sorted(self.tags))))
 
 
 class _Base(abc.ABC):
     """ Base class for Transactions and portfolio positions """
+    __slots__ = ("account", "_backend", "_raw", "_data", "_json")
+
+    ATTRIBUTES: FrozenSet[str] = frozenset()
+    # exported fields which are dropped by normalize
+    IGNORED_ATTRIBUTES = frozenset(["categoryId"])
+    # fields shown by repr
+    REPR_ATTRIBUTES: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """ create a read only property for each name in ATTRIBUTES """
+        super().__init_subclass__(**kwargs)
+        for name in cls.ATTRIBUTES:
+            if not hasattr(cls, name):
+                setattr(cls, name, property(lambda self, _name=name: self.get(_name)))
+
     def __init__(self, account: Account, data):
         self.account = account
         self._backend = account._backend
-        self.data = self.normalize(data)
+        self._raw = data
+        self._data: Optional[Dict[str, Any]] = None
+        # the serialized data, reset by the methods which change the data
+        self._json: Optional[str] = None
 
-    @staticmethod
-    def normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+    @property
+    def data(self) -> Dict[str, Any]:
+        """ the normalized data, only built when it is needed """
+        if self._data is None:
+            self._data = self.normalize(self._raw)
+        return self._data
+
+    @classmethod
+    def normalize(cls, data: Dict[str, Any]) -> Dict[str, Any]:
         res = {}
+        # locals for the lookups in the loop
+        ignored = cls.IGNORED_ATTRIBUTES
+        datetime_type = datetime.datetime
+        sentinel = _EPOCH_SENTINEL
         for name, value in data.items():
-            if isinstance(value, datetime.datetime):
-                value = value.date()
-                if value <= datetime.date(year=1970, month=1, day=2):
-                    continue
-            elif name in ("categoryId",):
+            if name in ignored:
                 continue
-            res[name] = value
+            if type(value) is datetime_type:  # pylint: disable=unidiomatic-typecheck
+                date = value.date()
+                if date > sentinel:
+                    res[name] = date
+            else:
+                res[name] = value
         return res
 
-    def __getattr__(self, name: str) -> Any:
-        if name not in self.ATTRIBUTES:
-            raise AttributeError(name)
-        return self.data.get(name, None)
+    @classmethod
+    def normalize_value(cls, name: str, value: Any) -> Any:
+        """ normalize a single value the same way as normalize, dropped values are None """
+        if name in cls.IGNORED_ATTRIBUTES:
+            return None
+        if type(value) is datetime.datetime:  # pylint: disable=unidiomatic-typecheck
+            value = value.date()
+            if value <= _EPOCH_SENTINEL:
+                return None
+        return value
+
+    if TYPE_CHECKING:
+        # the generated properties are not visible to type checkers
+        def __getattr__(self, name: str) -> Any:
+            ...
 
     def get(self, name: str) -> Any:
         """ similar to getattr, but never raises an exception """
-        return self.data.get(name, None)
+        if self._data is not None:
+            return self._data.get(name, None)
+        return self.normalize_value(name, self._raw.get(name, None))
+
+    def to_json(self) -> str:
+        """ the data serialized as JSON """
+        if self._json is None:
+            self._json = dumps(self.data)
+        return self._json
 
     def __repr__(self):
-        return json.dumps(self.data, separators=(",", ":"), default=serialize)
+        fields = " ".join(f"{name}={self.get(name)!r}" for name in self.REPR_ATTRIBUTES)
+        return f"<{type(self).__name__} {fields}>"
 
 class Position(_Base):
-    ATTRIBUTES = [
+    __slots__ = ()
+
+    REPR_ATTRIBUTES = ("name", "amount")
+
+    ATTRIBUTES = frozenset([
         "name",
         "market",  # Xetra, Tradegate, ...
         "type",  # share, bond, ...
@@ -100,11 +274,15 @@ class Position(_Base):
         "currencyOfProfit",
         "relativeProfit",
         "tradeTimstamp",
-    ]
+    ])
 
 
 class Transaction(_Base):
-    ATTRIBUTES = [
+    __slots__ = ("_comment",)
+
+    REPR_ATTRIBUTES = ("id", "amount")
+
+    ATTRIBUTES = frozenset([
         "accountNumber",
         "amount",
         "bankCode",
@@ -121,12 +299,30 @@ class Transaction(_Base):
         "purpose",
         "comment",
         "valueDate",
-    ]
+    ])
+
+    def __init__(self, account: Account, data):
+        super().__init__(account, data)
+        # the parsed comment together with the comment string it was parsed from
+        self._comment: Optional[Tuple[Optional[str], Comment]] = None
+
+    def _parsed_comment(self) -> Comment:
+        comment = self.comment
+        if self._comment is None or self._comment[0] != comment:
+            self._comment = (comment, Comment(comment))
+        return self._comment[1]
 
     def set_field(self, name: str, value: str) -> None:
-        assert name in self.ATTRIBUTES
+        self.set_fields({name: value})
+
+    def set_fields(self, fields: Dict[str, str]) -> None:
+        """ set several fields with one update """
+        assert all(name in self.ATTRIBUTES for name in fields)
         txid = self.data["id"]
-        self._backend.set_transaction_field(txid, name, value)
+        self._backend.update_transaction_fields(txid, fields)
+        for name, value in fields.items():
+            self.data[name] = exported_value(name, value)
+        self._json = None
 
     @property
     def payee(self) -> str:
@@ -148,16 +344,18 @@ class Transaction(_Base):
 
     @property
     def tags(self) -> Set[str]:
-        return Comment(self.comment).tags
+        return set(self._parsed_comment().tags)
 
     def add_tags(self, tag: str, *tags: str) -> None:
-        c = Comment(self.comment)
+        c = self._parsed_comment()
         c.add(tag)
         for t in tags:
             c.add(t)
         self.data["comment"] = str(c)
+        self._comment = (self.data["comment"], c)
         if c.changed:
-            self.set_field("comment", self.data["comment"])
+            c.changed = False
+            self.set_fields({"comment": self.data["comment"]})
 
 
 class Account:
@@ -198,13 +396,34 @@ class Account:
         if self.is_portfolio:
             return
 
-        if start_date is None:
-            start_date = datetime.date.today() - datetime.timedelta(days=age)
+        start_date = start_date_from_age(age, start_date)
+        tx_data = self._backend.iter_transactions(self.account_number, start_date, end_date)
+        yield from self.filter_transactions(tx_data, **tx_filter)
+
+    def filter_transactions(self, tx_data: Iterable[Dict[str, Any]], **tx_filter) -> Iterable[Transaction]:
+        """ wrap exported transactions of this account and apply the filter
+
+        The filter is applied to the exported data, only matching
+        transactions are wrapped.
+        """
+        match = transaction_filter(**tx_filter)
+        for data in tx_data:
+            if match(data):
+                yield Transaction(self, data)
+
+    def amounts(self, age=90, start_date=None, end_date=None, **tx_filter) -> Iterable[float]:
+        """ the amounts of the transactions which match the filter, see transactions for the arguments
 
-        for tx_data in self._backend.get_transactions(self.account_number, start_date, end_date):
-            tx = Transaction(self, tx_data)
-            if tx.pass_filter(**tx_filter):
-                yield tx
+        This reads the exported data directly and does not create Transaction objects.
+        """
+        if self.is_portfolio:
+            return
+
+        start_date = start_date_from_age(age, start_date)
+        match = transaction_filter(**tx_filter)
+        for data in self._backend.iter_transactions(self.account_number, start_date, end_date):
+            if match(data):
+                yield data["amount"]
 
     def positions(self) -> Iterable[Position]:
         """extract positions from a portfolio """
@@ -213,8 +432,12 @@ class Account:
         for tx_data in self._backend.get_positions(self.account_number):
             yield Position(self, tx_data)
 
+    def to_json(self) -> str:
+        """ the exported data serialized as JSON """
+        return dumps(self.data)
+
     def __repr__(self):
-        return json.dumps(self.data, separators=(",", ":"), default=serialize)
+        return f"<Account name={self.name!r} accountNumber={self.account_number!r}>"
 
 
 class BackendInterface(abc.ABC):
@@ -233,64 +456,421 @@ class BackendInterface(abc.ABC):
     def get_positions(self, account: str):
         ...
 
+    def iter_transactions(self, account: str, start_date: datetime.date,
+                          end_date: Optional[datetime.date]) -> Iterator[Dict[str, Any]]:
+        """ iterate over the exported transactions of an account
+
+        Unlike get_transactions, backends may hand out the transactions while
+        they are exported. The default iterates over get_transactions.
+        """
+        return iter(self.get_transactions(account, start_date, end_date))
+
+    # number of accounts which are exported concurrently by get_transactions_bulk
+    MAX_WORKERS = 8
+
+    def get_transactions_bulk(self, accounts: List[str], start_date: datetime.date,
+                              end_date: Optional[datetime.date]) -> Dict[str, List[Dict[str, Any]]]:
+        """ export the transactions of several accounts, keyed by account
+
+        The default implementation runs get_transactions for each account concurrently.
+        """
+        def export(account: str) -> List[Dict[str, Any]]:
+            return self.get_transactions(account, start_date, end_date)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            return dict(zip(accounts, executor.map(export, accounts)))
+
+    def get_transactions_batched(self, accounts: List[str], start_date: datetime.date,
+                                 end_date: Optional[datetime.date], fields: Iterable[str],
+                                 match: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, List[Any]]:
+        """ export the transactions of several accounts as columns
+
+        The result has a list for each name in fields, normalized like the
+        attributes of Transaction, and an "account" list with the account of
+        each transaction. Only transactions which pass match are included.
+        """
+        exported = self.get_transactions_bulk(accounts, start_date, end_date)
+        rows = [(account, data) for account in accounts for data in exported[account] if match is None or match(data)]
+        normalize = Transaction.normalize_value
+        columns = {name: [normalize(name, data.get(name)) for _, data in rows] for name in fields}
+        columns["account"] = [account for account, _ in rows]
+        return columns
+
+    async def get_transactions_async(self, account: str, start_date: datetime.date,
+                                     end_date: Optional[datetime.date]) -> List[Dict[str, Any]]:
+        """ async variant of get_transactions
+
+        The default implementation runs get_transactions in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_transactions, account, start_date, end_date)
+
     @abc.abstractmethod
     def set_transaction_field(self, txid: str, name: str, value: str):
         ...
 
+    def set_transaction_fields(self, txid: str, fields: Dict[str, str]) -> None:
+        """ set several fields of a transaction, the default sets them one by one """
+        for name, value in fields.items():
+            self.set_transaction_field(txid, name, value)
+
+    def set_transactions_fields(self, updates: Dict[str, Dict[str, str]]) -> None:
+        """ set the fields of several transactions, keyed by transaction id
+
+        The default updates the transactions concurrently.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            for future in [executor.submit(self.set_transaction_fields, txid, fields)
+                           for txid, fields in updates.items()]:
+                future.result()
+
+    # field updates collected by batch, by transaction id
+    _pending: Optional[Dict[str, Dict[str, str]]] = None
+
+    def update_transaction_fields(self, txid: str, fields: Dict[str, str]) -> None:
+        """ set fields of a transaction now, or at the end of the current batch """
+        if self._pending is not None:
+            self._pending.setdefault(txid, {}).update(fields)
+        else:
+            self.set_transaction_fields(txid, fields)
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """ collect the field updates of the block and send them when it ends
+
+        Transaction objects show the new values as soon as they are set. If the
+        block raises, the updates are dropped. If sending them fails, they may
+        be partly applied in MoneyMoney, and the cached exports are dropped.
+        """
+        if self._pending is not None:
+            yield
+            return
+        self._pending = {}
+        try:
+            yield
+            pending = self._pending
+        finally:
+            # if the block raised, the collected updates are dropped
+            self._pending = None
+        if pending:
+            self.set_transactions_fields(pending)
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """ forget cached data, backends without a cache do nothing """
+
 
 class Backend(BackendInterface):
     MAC_APP_NAME = "MoneyMoney"
+    # separates the plist documents of a bulk export (ASCII record separator)
+    BULK_SEPARATOR = 30
+    # seconds an export is reused before MoneyMoney is asked again
+    CACHE_TTL = 60.0
+    ACCOUNT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "py-money")
+
+    def __init__(self, cache_ttl: float = CACHE_TTL):
+        self.cache_ttl = cache_ttl
+        # seconds the accounts export is reused from a file, so it survives the process
+        self.account_cache_ttl = env_seconds("MM_ACCOUNT_CACHE_TTL")
+        self._cache: Dict[Tuple[str, ...], Tuple[float, Any]] = {}
+        # the bulk fallback fills the cache from several threads, the lock guards the cache and the id index
+        self._cache_lock = threading.RLock()
+        # the cached transactions by id, a transaction can be part of several cached exports
+        self._transactions_by_id: Dict[Any, List[Dict[str, Any]]] = {}
+
+    def run_apple_script(self, script: str) -> bytes:
+        return utils.applescript(script)
 
     @staticmethod
-    def run_apple_script(script: str) -> bytes:
-        return utils.applescript(script)
+    def load_plist(data: bytes) -> Any:
+        """ parse a plist as written by the MoneyMoney exports
+
+        MoneyMoney always exports XML plists, so there is no format detection.
+        lxml is used for parsing if it is installed.
+        """
+        return _plist.loads(data)
+
+    def run_apple_script_plist(self, script: str) -> Any:
+        """ run an export script and parse the plist while osascript writes it """
+        return utils.applescript_plist(script)
+
+    def run_apple_script_plist_items(self, script: str, key: str) -> Iterator[Any]:
+        """ run an export script and yield the items of the array stored under key while it is parsed """
+        return utils.applescript_plist_items(script, key)
+
+    def _cache_get(self, key: Tuple[str, ...]) -> Optional[Any]:
+        """ return the cached value for key if it is younger than cache_ttl, expired values are dropped """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] < self.cache_ttl:
+                return entry[1]
+            self._cache_drop(key)
+            return None
+
+    def _cache_put(self, key: Tuple[str, ...], value: Any) -> None:
+        if self.cache_ttl <= 0:
+            return
+        with self._cache_lock:
+            # the keys of age based exports change every day, so expired entries are not always read again
+            now = time.monotonic()
+            for old in [old for old, (stamp, _) in self._cache.items() if old == key or now - stamp >= self.cache_ttl]:
+                self._cache_drop(old)
+            self._cache[key] = (now, value)
+            if key[0] == "transactions":
+                for tx in value:
+                    self._transactions_by_id.setdefault(tx.get("id"), []).append(tx)
+
+    def _cache_drop(self, key: Tuple[str, ...]) -> None:
+        """ remove a cached value and its transactions from the id index """
+        with self._cache_lock:
+            entry = self._cache.pop(key, None)
+            if entry is None or key[0] != "transactions":
+                return
+            for tx in entry[1]:
+                txid = tx.get("id")
+                indexed = [other for other in self._transactions_by_id.get(txid, []) if other is not tx]
+                if indexed:
+                    self._transactions_by_id[txid] = indexed
+                else:
+                    self._transactions_by_id.pop(txid, None)
+
+    def _cached(self, key: Tuple[str, ...], fetch: Callable[[], Any]) -> Any:
+        """ return the cached value for key or call fetch if there is none """
+        value = self._cache_get(key)
+        if value is None:
+            value = fetch()
+            self._cache_put(key, value)
+        return value
+
+    @staticmethod
+    def _transactions_key(account: str, start_date, end_date) -> Tuple[str, ...]:
+        return ("transactions", account, start_date.isoformat(), end_date.isoformat() if end_date else "")
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """ forget cached exports, either all of them or only those of the given kind """
+        with self._cache_lock:
+            if kind is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[0] == kind]:
+                    self._cache.pop(key, None)
+            if kind in (None, "transactions"):
+                self._transactions_by_id.clear()
+        if kind in (None, "accounts") and self.account_cache_ttl > 0:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._account_cache_path(_ACCOUNTS_CMD % self.MAC_APP_NAME))
 
     def get_accounts(self) -> List[Dict[str, Any]]:
-        script = f'tell application "{self.MAC_APP_NAME}" to export accounts'
+        return self._cached(("accounts",), self._get_accounts)
+
+    def _get_accounts(self) -> List[Dict[str, Any]]:
+        script = _ACCOUNTS_CMD % self.MAC_APP_NAME
+        if self.account_cache_ttl <= 0:
+            return self.run_apple_script_plist(script)
+        path = self._account_cache_path(script)
+        try:
+            if time.time() - os.path.getmtime(path) < self.account_cache_ttl:
+                with open(path, "rb") as fd:
+                    return self.load_plist(fd.read())
+        except (OSError, ExpatError, ValueError):
+            pass
         data = self.run_apple_script(script)
-        return plistlib.loads(data)
+        res = self.load_plist(data)
+        self._write_account_cache(path, data)
+        return res
+
+    def _account_cache_path(self, script: str) -> str:
+        """ the file of the accounts export, named by the script so other apps do not share it """
+        digest = hashlib.sha256(script.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.ACCOUNT_CACHE_DIR, f"accounts-{digest}.plist")
+
+    @staticmethod
+    def _write_account_cache(path: str, data: bytes) -> None:
+        """ write the export only readable by the user, a failure only means there is no cache """
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}"
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as fd:
+                fd.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
 
     def get_transactions(self, account: str, start_date, end_date):
-        cmd = []
-        cmd += [f'tell application "{self.MAC_APP_NAME}" to export transactions']
-        cmd += [f'from account "{account}"']
-        cmd += [f'from date "{start_date.strftime("%d/%m/%Y")}"']
-        if end_date is not None:
-            cmd += [f'to date "{end_date.strftime("%d/%m/%Y")}"']
-        cmd += ['as "plist"']
-        data = self.run_apple_script(" ".join(cmd))
-        return plistlib.loads(data).get("transactions", [])
+        key = self._transactions_key(account, start_date, end_date)
+        return self._cached(key, lambda: self._get_transactions(account, start_date, end_date))
+
+    def _get_transactions(self, account: str, start_date, end_date):
+        return list(self._stream_transactions(account, start_date, end_date))
+
+    def iter_transactions(self, account: str, start_date, end_date):
+        """ iterate over the exported transactions, without a cache they are handed out while they are parsed """
+        if self.cache_ttl > 0:
+            return iter(self.get_transactions(account, start_date, end_date))
+        return self._stream_transactions(account, start_date, end_date)
+
+    def _stream_transactions(self, account: str, start_date, end_date) -> Iterator[Dict[str, Any]]:
+        script = self._transactions_script(account, start_date, end_date)
+        return self.run_apple_script_plist_items(script, "transactions")
+
+    async def get_transactions_async(self, account, start_date, end_date):
+        """ export transactions with an osascript subprocess driven by asyncio
+
+        The plist is parsed in the default executor to keep the event loop responsive.
+        """
+        key = self._transactions_key(account, start_date, end_date)
+        tx_data = self._cache_get(key)
+        if tx_data is None:
+            data = await utils.applescript_async(self._transactions_script(account, start_date, end_date))
+            loop = asyncio.get_running_loop()
+            tx_data = (await loop.run_in_executor(None, self.load_plist, data)).get("transactions", [])
+            self._cache_put(key, tx_data)
+        return tx_data
+
+    def _transactions_script(self, account: str, start_date, end_date) -> str:
+        return _TRANSACTIONS_CMD % (self.MAC_APP_NAME, account, format_date(start_date),
+                                    self._end_date_clause(end_date))
+
+    @staticmethod
+    def _end_date_clause(end_date: Optional[datetime.date]) -> str:
+        if end_date is None:
+            return ""
+        return _END_DATE_CLAUSE % format_date(end_date)
+
+    def get_transactions_bulk(self, accounts, start_date, end_date):
+        """ export the transactions of several accounts with a single AppleScript call
+
+        Accounts with a cached export are not exported again. If the combined
+        script fails, this falls back to one export per account.
+        """
+        res = {}
+        for account in accounts:
+            tx_data = self._cache_get(self._transactions_key(account, start_date, end_date))
+            if tx_data is not None:
+                res[account] = tx_data
+        missing = [account for account in accounts if account not in res]
+        if len(missing) > 1:
+            try:
+                res.update(self._get_transactions_bulk(missing, start_date, end_date))
+            except (utils.AppleScriptException, ExpatError, ValueError):
+                res.update(super().get_transactions_bulk(missing, start_date, end_date))
+        elif missing:
+            res[missing[0]] = self.get_transactions(missing[0], start_date, end_date)
+        return {account: res[account] for account in accounts}
+
+    def _get_transactions_bulk(self, accounts: List[str], start_date, end_date):
+        script = _TRANSACTIONS_BULK_CMD % (
+            self.MAC_APP_NAME,
+            ", ".join(f'"{account}"' for account in accounts),
+            format_date(start_date),
+            self._end_date_clause(end_date),
+            self.BULK_SEPARATOR,
+        )
+        data = self.run_apple_script(script)
+        chunks = [chunk for chunk in data.split(bytes([self.BULK_SEPARATOR])) if chunk.strip()]
+        if len(chunks) != len(accounts):
+            raise ValueError(f"expected {len(accounts)} exports, got {len(chunks)}")
+        res = dict(zip(accounts, self._parse_bulk_chunks(chunks)))
+        for account, tx_data in res.items():
+            self._cache_put(self._transactions_key(account, start_date, end_date), tx_data)
+        return res
+
+    def _parse_bulk_chunks(self, chunks: List[bytes]) -> List[List[Dict[str, Any]]]:
+        """ parse the exports of a bulk export in the calling thread
+
+        No worker processes are used: with the spawn start method of macOS they
+        would import the __main__ module of the caller again.
+        """
+        return [self.load_plist(chunk).get("transactions", []) for chunk in chunks]
 
     def get_positions(self, account: str):
-        cmd = []
-        cmd += [f'tell application "{self.MAC_APP_NAME}" to export portfolio']
-        cmd += [f'from account "{account}"']
-        cmd += ['as "plist"']
+        return self._cached(("positions", account), lambda: self._get_positions(account))
 
-        res = self.run_apple_script(" ".join(cmd))
-        tx_data = plistlib.loads(res)
-        return tx_data.get("portfolio", [])
+    def _get_positions(self, account: str):
+        return self.run_apple_script_plist(_PORTFOLIO_CMD % (self.MAC_APP_NAME, account)).get("portfolio", [])
 
     def set_transaction_field(self, txid: str, name: str, value: str):
-        cmd = [
-            f'tell application "{self.MAC_APP_NAME}"',
-            f"to set transaction id {txid}",
-            f'{name} to "{value}"',
-        ]
-        self.run_apple_script(" ".join(cmd))
+        self.run_apple_script(_SET_FIELD_CMD % (self.MAC_APP_NAME, txid, name, escape_string(value)))
+        self._update_cached_transaction(txid, {name: value})
+
+    def set_transaction_fields(self, txid: str, fields: Dict[str, str]) -> None:
+        """ set several fields of a transaction with a single AppleScript call """
+        self.set_transactions_fields({txid: fields})
+
+    def set_transactions_fields(self, updates: Dict[str, Dict[str, str]]) -> None:
+        """ set the fields of several transactions with a single AppleScript call """
+        items = [(txid, name, value) for txid, fields in updates.items() for name, value in fields.items()]
+        if len(items) == 1:
+            # a single line also works with the interactive osascript session
+            self.set_transaction_field(*items[0])
+            return
+        statements = "\n".join(_SET_FIELD_STATEMENT % (txid, name, escape_string(value))
+                               for txid, name, value in items)
+        try:
+            self.run_apple_script(_SET_FIELDS_CMD % (self.MAC_APP_NAME, statements))
+        except Exception:
+            # the statements before the failing one are applied, the cached exports can not tell which
+            self.invalidate("transactions")
+            raise
+        for txid, fields in updates.items():
+            self._update_cached_transaction(txid, fields)
+
+    def _update_cached_transaction(self, txid: str, fields: Dict[str, str]) -> None:
+        """ update the cached exports instead of exporting again """
+        with self._cache_lock:
+            for tx in self._transactions_by_id.get(txid, []):
+                for name, value in fields.items():
+                    tx[name] = exported_value(name, value)
+
+
+class PersistentBackend(Backend):
+    """ A backend which sends all scripts to one long-lived osascript process
+
+    This saves the startup of osascript and of the AppleScript runtime for
+    every call. By default the process is shared with all other users of
+    utils.shared_session().
+    """
+    def __init__(self, cache_ttl: float = Backend.CACHE_TTL, session: Optional[utils.OsascriptSession] = None):
+        super().__init__(cache_ttl=cache_ttl)
+        self._session = session or utils.shared_session()
+
+    def run_apple_script(self, script: str) -> bytes:
+        return self._session.run(script)
+
+    def run_apple_script_plist(self, script: str) -> Any:
+        return self.load_plist(self.run_apple_script(script))
+
+    def run_apple_script_plist_items(self, script: str, key: str) -> Iterator[Any]:
+        return _plist.iterload(io.BytesIO(self.run_apple_script(script)), key)
+
+    def close(self) -> None:
+        """ terminate the osascript process """
+        self._session.close()
 
 
 class MoneyMoney:
     """ An interface to the MoneyMoney app """
-    def __init__(self, backend: BackendInterface = Backend()):
-        self._backend = backend
+    def __init__(self, backend: Optional[BackendInterface] = None):
+        # every instance gets its own backend, so the export caches are not shared
+        self._backend = backend if backend is not None else Backend()
+        self.data: List[Dict[str, Any]] = []
+        self._account_objs: List[Account] = []
+        self._load()
+
+    def _load(self) -> None:
         self.data = self._backend.get_accounts()
+        self._account_objs = [Account(self._backend, account) for account in self.data
+                              if account.get("group") is not True]
+
+    def refresh(self) -> None:
+        """ drop all cached data and export the accounts again """
+        self._backend.invalidate()
+        self._load()
 
     def _accounts(self) -> Iterable[Account]:
         """ return all accounts """
-        for account in self.data:
-            if account.get("group") is not True:
-                yield Account(self._backend, account)
+        return iter(self._account_objs)
 
     def accounts(self) -> Iterable[Account]:
         return (account for account in self._accounts() if account.is_portfolio is False)
@@ -310,6 +890,65 @@ class MoneyMoney:
                 return portfolio
         return None
 
-    def transactions(self, *args, **kwargs):
-        for account in self.accounts():
-            yield from account.transactions(*args, **kwargs)
+    def batch(self) -> contextlib.AbstractContextManager:
+        """ delay all field updates, like set_checkmark or add_tags, to the end of the block
+
+        A failed update at the end of the block may leave the others applied,
+        see BackendInterface.batch.
+        """
+        return self._backend.batch()
+
+    def prefetch_transactions(self, age=90, start_date=None, end_date=None) -> None:
+        """ export the transactions of all accounts in one go
+
+        The backend caches the exports, so Account.transactions() with the
+        same date range does not run another export per account.
+        """
+        accounts = [account.account_number for account in self.accounts()]
+        self._backend.get_transactions_bulk(accounts, start_date_from_age(age, start_date), end_date)
+
+    def columns(self, fields: Iterable[str], age=90, start_date=None, end_date=None,
+                **tx_filter) -> Dict[str, List[Any]]:
+        """ the given fields of the transactions of all accounts as one list per field
+
+        The "account" list holds the account name of each transaction. See
+        Account.transactions for the other arguments. No Transaction objects
+        are created.
+        """
+        accounts = list(self.accounts())
+        names = {account.account_number: account.name for account in accounts}
+        columns = self._backend.get_transactions_batched(list(names), start_date_from_age(age, start_date), end_date,
+                                                         fields, transaction_filter(**tx_filter))
+        columns["account"] = [names[number] for number in columns["account"]]
+        return columns
+
+    def transactions(self, age=90, start_date=None, end_date=None, **tx_filter) -> Iterable[Transaction]:
+        """ transactions of all accounts, see Account.transactions for the arguments
+
+        All accounts are exported in one go by the backend, the order of the
+        result is the same as iterating over the accounts one by one.
+        """
+        accounts = list(self.accounts())
+        start_date = start_date_from_age(age, start_date)
+        exported = self._backend.get_transactions_bulk([a.account_number for a in accounts], start_date, end_date)
+        for account in accounts:
+            yield from account.filter_transactions(exported[account.account_number], **tx_filter)
+
+    async def transactions_async(self, age=90, start_date=None, end_date=None, **tx_filter) -> List[Transaction]:
+        """ async variant of transactions
+
+        At most MAX_WORKERS accounts of the backend are exported at the same time.
+        """
+        accounts = list(self.accounts())
+        start_date = start_date_from_age(age, start_date)
+        semaphore = asyncio.Semaphore(self._backend.MAX_WORKERS)
+
+        async def export(account: Account) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._backend.get_transactions_async(account.account_number, start_date, end_date)
+
+        exported = await asyncio.gather(*(export(account) for account in accounts))
+        res: List[Transaction] = []
+        for account, tx_data in zip(accounts, exported):
+            res.extend(account.filter_transactions(tx_data, **tx_filter))
+        return res
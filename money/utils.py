@@ -1,22 +1,296 @@
 """
 Some helper functions.
 """
+import asyncio
+import atexit
+import io
+import os
+import threading
+import uuid
 from subprocess import Popen, PIPE
+from typing import IO, Any, Iterator, List, Optional, cast
+from xml.parsers.expat import ExpatError
+
+from . import _osa_parse, _plist
+
+
+OSASCRIPT_COMMAND = ["osascript", "-"]
+OSASCRIPT_SESSION_COMMAND = ["osascript", "-i", "-s", "s"]
+OSASCRIPT_TIMEOUT = 60
+# upper bound for the output of a single osascript call
+MAX_OUTPUT_BYTES = 64 << 20
+# run all scripts through one shared osascript process, see shared_session
+PERSISTENT_OSASCRIPT = os.environ.get("MM_PERSISTENT_OSASCRIPT", "") not in ("", "0")
 
 
 class AppleScriptException(Exception):
     pass
 
 
+class _BoundedReader:  # pylint: disable=too-few-public-methods
+    """ file like wrapper which fails once more than limit bytes are read """
+    def __init__(self, fp: IO[bytes], limit: int):
+        self._fp = fp
+        self._limit = limit
+        self._count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fp.read(size)
+        self._count += len(data)
+        if self._count > self._limit:
+            raise AppleScriptException(f"output exceeds {self._limit} bytes")
+        return data
+
+
 def applescript(cmd: str) -> bytes:
     """Execute an apple script command.
 
+    If PERSISTENT_OSASCRIPT is set, the command runs in the shared osascript
+    session, otherwise in a new osascript process.
     Return the output of the command or raise an exception on failure.
     """
-    command = ["osascript", "-"]
+    if PERSISTENT_OSASCRIPT:
+        return shared_session().run(cmd)
+    return _applescript_once(cmd)
 
-    with Popen(command, stdin=PIPE, stdout=PIPE, stderr=PIPE) as proc:
-        out, err = proc.communicate(input=cmd.encode("utf-8"), timeout=60)
-        if proc.returncode != 0:
-            raise AppleScriptException(f'{err.decode("utf-8")}')
+
+class _OsascriptProcess:
+    """A one-shot osascript process running a script.
+
+    stdout is read through a _BoundedReader. stderr is drained on a thread,
+    so a script which logs a lot can not block while stdout is read. The
+    process is killed after OSASCRIPT_TIMEOUT seconds.
+    """
+    def __init__(self, cmd: str):
+        # pylint: disable-next=consider-using-with
+        self._proc = Popen(OSASCRIPT_COMMAND, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        assert self._proc.stdin and self._proc.stdout and self._proc.stderr
+        self._timed_out = False
+        self._timer = threading.Timer(OSASCRIPT_TIMEOUT, self._kill)
+        self._timer.start()
+        self._err: List[bytes] = []
+        stderr = self._proc.stderr
+        self._err_thread = threading.Thread(target=lambda: self._err.append(stderr.read()), daemon=True)
+        self._err_thread.start()
+        self.stdout = cast(IO[bytes], _BoundedReader(self._proc.stdout, MAX_OUTPUT_BYTES))
+        try:
+            self._proc.stdin.write(cmd.encode("utf-8"))
+            self._proc.stdin.close()
+        except BaseException:
+            self.close()
+            raise
+
+    def _kill(self) -> None:
+        self._timed_out = True
+        self._proc.kill()
+
+    def wait(self) -> None:
+        """ wait for osascript to exit, raise an exception if it failed or timed out """
+        returncode = self._proc.wait()
+        self._err_thread.join()
+        if self._timed_out:
+            raise AppleScriptException(f"osascript timed out after {OSASCRIPT_TIMEOUT}s")
+        if returncode != 0:
+            raise AppleScriptException(f'{b"".join(self._err).decode("utf-8")}')
+
+    def close(self) -> None:
+        """ stop the timer and kill osascript if it is still running """
+        self._timer.cancel()
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+        self._err_thread.join()
+        for stream in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            if stream:
+                stream.close()
+
+    def __enter__(self) -> "_OsascriptProcess":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _applescript_once(cmd: str) -> bytes:
+    """ run the command in a new osascript process, reading at most MAX_OUTPUT_BYTES of its output """
+    with _OsascriptProcess(cmd) as proc:
+        # read in chunks, so the limit is checked before the output is buffered
+        out = b"".join(iter(lambda: proc.stdout.read(1 << 16), b""))
+        proc.wait()
+        # the raw bytes go straight to the plist parser, there is no decode/encode round trip
         return out
+
+
+def applescript_plist(cmd: str) -> Any:
+    """Execute an apple script command which returns a XML plist.
+
+    The plist is parsed while osascript writes it, the raw output is never
+    held in memory. If PERSISTENT_OSASCRIPT is set, the command runs in the
+    shared osascript session instead and its output is parsed afterwards.
+    Return the parsed plist or raise an exception on failure.
+    """
+    if PERSISTENT_OSASCRIPT:
+        return _plist.loads(shared_session().run(cmd))
+    with _OsascriptProcess(cmd) as proc:
+        try:
+            res = _plist.load(proc.stdout)
+        except (ExpatError, ValueError) as exc:
+            # a failed or killed osascript explains the broken plist
+            try:
+                proc.wait()
+            except AppleScriptException as failure:
+                raise failure from exc
+            raise
+        proc.wait()
+        return res
+
+
+def applescript_plist_items(cmd: str, key: str) -> Iterator[Any]:
+    """Execute an apple script command which returns a XML plist with a top level dict.
+
+    The items of the array stored under key are yielded while osascript
+    writes the plist, the array itself is never built. osascript is started
+    on the first item and killed if the iteration stops early. If
+    PERSISTENT_OSASCRIPT is set, the command runs in the shared osascript
+    session instead and the items are read from its output.
+    """
+    if PERSISTENT_OSASCRIPT:
+        yield from _plist.iterload(io.BytesIO(shared_session().run(cmd)), key)
+        return
+    with _OsascriptProcess(cmd) as proc:
+        try:
+            yield from _plist.iterload(proc.stdout, key)
+        except (ExpatError, ValueError) as exc:
+            try:
+                proc.wait()
+            except AppleScriptException as failure:
+                raise failure from exc
+            raise
+        proc.wait()
+
+
+class OsascriptSession:
+    """A long-lived interactive osascript process.
+
+    Each script is written as one line to ``osascript -i``. It is followed by a
+    ``log`` of a unique marker, which osascript writes to stderr, and by the
+    marker itself, whose result is written to stdout. Output before the
+    markers belongs to the script, anything on stderr is an error.
+
+    Results are printed in source form, so a string result is quoted and can
+    be decoded exactly, even if it spans several lines.
+    """
+    MARKER_PREFIX = "===END==="
+    PROMPTS = (b">> ", b"=> ", b"? ")
+
+    def __init__(self) -> None:
+        self._proc: Optional[Popen] = None
+        self._lock = threading.Lock()
+
+    def _process(self) -> Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            # pylint: disable-next=consider-using-with
+            self._proc = Popen(OSASCRIPT_SESSION_COMMAND, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        return self._proc
+
+    def run(self, cmd: str) -> bytes:
+        """Execute an apple script command in the session.
+
+        Return the output of the command or raise an exception on failure.
+        Scripts with several lines can not be sent to the interactive mode,
+        they are run with a fresh osascript process.
+        """
+        if "\n" in cmd:
+            return _applescript_once(cmd)
+        marker = f"{self.MARKER_PREFIX}{uuid.uuid4().hex}".encode("utf-8")
+        with self._lock:
+            proc = self._process()
+            assert proc.stdin and proc.stdout and proc.stderr
+            timer = threading.Timer(OSASCRIPT_TIMEOUT, proc.kill)
+            timer.start()
+            try:
+                proc.stdin.write(cmd.encode("utf-8") + b'\nlog "' + marker + b'"\n"' + marker + b'"\n')
+                proc.stdin.flush()
+                out = self._read_until(proc.stdout, marker)
+                err = self._read_until(proc.stderr, marker)
+            finally:
+                timer.cancel()
+        if err.strip():
+            raise AppleScriptException(f'{err.decode("utf-8")}')
+        return self._decode_result(self._strip_prompts(out))
+
+    def _read_until(self, stream: IO[bytes], marker: bytes) -> bytes:
+        lines: List[bytes] = []
+        for line in iter(stream.readline, b""):
+            if marker in line:
+                return b"".join(lines)
+            lines.append(line)
+        self.close()
+        raise AppleScriptException("osascript session terminated")
+
+    def _strip_prompts(self, out: bytes) -> bytes:
+        """ remove the prompts of the interactive mode around the result """
+        lines = out.splitlines(keepends=True)
+        while lines and lines[-1].strip() in [b""] + [prompt.strip() for prompt in self.PROMPTS]:
+            lines.pop()
+        if lines:
+            for prompt in self.PROMPTS:
+                while lines[0].startswith(prompt):
+                    lines[0] = lines[0][len(prompt):]
+        return b"".join(lines)
+
+    @staticmethod
+    def _decode_result(out: bytes) -> bytes:
+        """ unquote a string result, like osascript prints it without -s s """
+        text = out.decode("utf-8").strip()
+        if not text.startswith('"'):
+            return out
+        try:
+            value = _osa_parse.loads(text)
+        except ValueError:
+            return out
+        return value.encode("utf-8") + b"\n"
+
+    def close(self) -> None:
+        """ terminate the osascript process, the next call starts a new one """
+        proc, self._proc = self._proc, None
+        if proc is not None:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            for stream in (proc.stdin, proc.stdout, proc.stderr):
+                if stream:
+                    stream.close()
+
+
+_shared_session: Optional[OsascriptSession] = None
+_shared_session_lock = threading.Lock()
+
+
+def shared_session() -> OsascriptSession:
+    """ the osascript session shared within this process, it is started on first use """
+    global _shared_session  # pylint: disable=global-statement
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = OsascriptSession()
+            atexit.register(_shared_session.close)
+        return _shared_session
+
+
+async def applescript_async(cmd: str) -> bytes:
+    """Execute an apple script command without blocking the event loop.
+
+    Return the output of the command or raise an exception on failure.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *OSASCRIPT_COMMAND, stdin=PIPE, stdout=PIPE, stderr=PIPE
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(input=cmd.encode("utf-8")), OSASCRIPT_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise AppleScriptException(f'{err.decode("utf-8")}')
+    return out
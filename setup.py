@@ -14,6 +14,10 @@ setuptools.setup(
     url="https://github.com/MirkoDziadzka/py-money",
     packages=setuptools.find_packages(),
     install_requires=[],
+    extras_require={
+        # optional, faster plist parsing and to_json
+        "speedups": ["lxml", "orjson", "google-re2"],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -1,5 +1,6 @@
 import csv
 import datetime
+import itertools
 
 import money
 
@@ -34,6 +35,9 @@ FIELDS = [
 # Transactions of the last 7 days
 #
 
+# export the transactions of all accounts at once, the loops below reuse it
+instance.prefetch_transactions(age=30)
+
 print("Show all new, booked and unchecked transactions")
 for account in instance.accounts():
     print(f"Checking account {account.name}")
@@ -62,9 +66,12 @@ for tx in instance.transactions(age=30, booked=True, category=category):
 
 print(f"Convert all transactions to csv '{FILENAME}'")
 
+# the first field is the name of the account, the others are read from the exported data
+DATA_FIELDS = FIELDS[1:]
+
 with open(FILENAME, "w", encoding="utf-8") as fd:
-    writer = csv.DictWriter(fd, FIELDS, restval="", extrasaction="raise")
-    writer.writeheader()
+    writer = csv.writer(fd)
+    writer.writerow(FIELDS)
 
     for account in instance.accounts():
         print(f"Writing data for account {account.name} ...", end="", flush=True)
@@ -72,8 +79,7 @@ with open(FILENAME, "w", encoding="utf-8") as fd:
         begin_of_time = datetime.date(year=2000, month=1, day=1)
         for tx in account.transactions(start_date=begin_of_time, booked=True):
             assert tx.booked is True
-            row = dict(tx.data, account=tx.account.name)
-            writer.writerow(row)
+            writer.writerow((account.name, *map(tx.data.get, DATA_FIELDS, itertools.repeat(""))))
             count += 1
         print(f"wrote {count} entries")
 
@@ -1,24 +1,28 @@
 """ pytest config
 """
 
+import copy
 import os
 from datetime import date
-from typing import Optional
+from typing import FrozenSet, Optional
 
 import pytest
-from yaml import safe_load
+import yaml
 
 from money import MoneyMoney
 from money.backends.MoneyMoney import BackendInterface
 
 
 TESTDIR = os.path.dirname(__file__)
+# libyaml is much faster, it is not available in every PyYAML build
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 class MockedBackend(BackendInterface):
     """ Mock for the actual MoneyMoney backend."""
     def __init__(self, data):
         self.data = data
+        self._tx_index = {tx["id"]: tx for txs in data.get("transactions", {}).values() for tx in txs}
 
     def get_accounts(self):
         return self.data["accounts"]
@@ -30,20 +34,41 @@ class MockedBackend(BackendInterface):
         return self.data["transactions"][account]
 
     def set_transaction_field(self, txid: str, name: str, value: str):
-        print(txid, name, value)
-        for txlist in self.data["transactions"].values():
-            for tx in txlist:
-                print(tx)
-                if tx["id"] == txid:
-                    if name == "checkmark":
-                        tx["checkmark"] = value == "on"
-                    else:
-                        raise NotImplementedError
+        tx = self._tx_index.get(txid)
+        if tx is None:
+            return
+        if name == "checkmark":
+            tx["checkmark"] = value == "on"
+        else:
+            raise NotImplementedError
 
 
-@pytest.fixture
-def instance() -> MoneyMoney:
+@pytest.fixture(scope="session")
+def _raw_data():
+    """ the mocked data, parsed once per test session """
     with open(os.path.join(TESTDIR, "backend_config.yml"), "rb") as fd:
-        data = safe_load(fd.read())
-        backend = MockedBackend(data)
-        return MoneyMoney(backend=backend)
+        return yaml.load(fd, Loader=_YAML_LOADER)
+
+
+@pytest.fixture
+def instance(_raw_data) -> MoneyMoney:
+    """ an instance of its own copy of the data, for tests which change it """
+    return MoneyMoney(backend=MockedBackend(copy.deepcopy(_raw_data)))
+
+
+@pytest.fixture(scope="session")
+def instance_ro(_raw_data) -> MoneyMoney:
+    """ an instance shared by all tests, which must not change it """
+    return MoneyMoney(backend=MockedBackend(_raw_data))
+
+
+@pytest.fixture(scope="session")
+def account_names(instance_ro) -> FrozenSet[str]:
+    """ the names of the accounts, collected once """
+    return frozenset(account.name for account in instance_ro.accounts())
+
+
+@pytest.fixture(scope="session")
+def portfolio_names(instance_ro) -> FrozenSet[str]:
+    """ the names of the portfolios, collected once """
+    return frozenset(account.name for account in instance_ro.portfolios())
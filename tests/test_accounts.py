@@ -1,34 +1,39 @@
 """ unit tests
 """
 
+import asyncio
+import datetime
+
 import pytest
 
 from money import MoneyMoney
+from money.backends import MoneyMoney as backend_module
+from money.backends.MoneyMoney import Comment, Transaction
 
-def test_accounts_are_present(instance: MoneyMoney):
-    accounts = list(instance.accounts())
+def test_accounts_are_present(instance_ro: MoneyMoney):
+    accounts = list(instance_ro.accounts())
     assert len(accounts) == 2
 
 @pytest.mark.parametrize("name", ["Postbank", "Deutsche Bank"])
-def test_accounts_have_name(instance, name):
-    assert name in (a.name for a in instance.accounts())
+def test_accounts_have_name(account_names, name):
+    assert name in account_names
 
-def test_portfolios_are_present(instance: MoneyMoney):
-    portfolios = list(instance.portfolios())
+def test_portfolios_are_present(instance_ro: MoneyMoney):
+    portfolios = list(instance_ro.portfolios())
     assert len(portfolios) == 1
 
 @pytest.mark.parametrize("name", ["Comdirect"])
-def test_portfolios_have_name(instance, name: MoneyMoney):
-    assert name in (a.name for a in instance.portfolios())
+def test_portfolios_have_name(portfolio_names, name):
+    assert name in portfolio_names
 
-def test_transactions_are_present(instance: MoneyMoney):
-    account = instance.account("Deutsche Bank")
+def test_transactions_are_present(instance_ro: MoneyMoney):
+    account = instance_ro.account("Deutsche Bank")
     assert account is not None
     txns = list(account.transactions())
     assert txns
 
-def test_positions_are_present(instance: MoneyMoney):
-    account = instance.portfolio("Comdirect")
+def test_positions_are_present(instance_ro: MoneyMoney):
+    account = instance_ro.portfolio("Comdirect")
     assert account is not None
     assert account.name == "Comdirect"
     positions = list(account.positions())
@@ -48,3 +53,80 @@ def test_check_booked_but_unchecked_transactions(instance: MoneyMoney):
     for account in instance.accounts():
         assert not list(account.transactions(age=30, booked=True, checked=False))
 
+
+def test_transactions_of_all_accounts(instance_ro: MoneyMoney):
+    txns = list(instance_ro.transactions(booked=True))
+    assert [tx.data["id"] for tx in txns] == [1001, 2001]
+
+def test_transaction_dates_are_normalized(instance_ro: MoneyMoney):
+    account = instance_ro.account("Deutsche Bank")
+    assert account is not None
+    tx = Transaction(account, {
+        "bookingDate": datetime.datetime(2023, 1, 2, 12, 0),
+        "valueDate": datetime.datetime(1970, 1, 1),
+        "categoryId": 7,
+    })
+    assert tx.bookingDate == datetime.date(2023, 1, 2)
+    assert tx.valueDate is None
+    assert tx.get("categoryId") is None
+    assert tx.data == {"bookingDate": datetime.date(2023, 1, 2)}
+
+def test_comment_tags():
+    c = Comment("Steuer 2023 <tag:tax-relevant> <tag:donation>")
+    assert c.text == "Steuer 2023"
+    assert c.tags == {"tax-relevant", "donation"}
+    assert Comment(str(c)).tags == c.tags
+    assert str(c) == "Steuer 2023 <tag:donation> <tag:tax-relevant>"
+    assert str(Comment("<tag:b> <tag:a>")) == "<tag:a> <tag:b>"
+
+def test_transactions_async(instance_ro: MoneyMoney):
+    txns = asyncio.run(instance_ro.transactions_async(booked=True))
+    assert [tx.data["id"] for tx in txns] == [1001, 2001]
+
+def test_amounts(instance_ro: MoneyMoney):
+    account = instance_ro.account("Deutsche Bank")
+    assert account is not None
+    assert list(account.amounts()) == [100, 100]
+    assert list(account.amounts(booked=False)) == [100]
+
+def test_refresh(instance: MoneyMoney):
+    instance._backend.data["accounts"].append(  # type: ignore[attr-defined]
+        {"name": "Sparkasse", "portfolio": False, "accountNumber": "A3333333333"})
+    assert instance.account("Sparkasse") is None
+    instance.refresh()
+    assert instance.account("Sparkasse") is not None
+
+def test_batch(instance: MoneyMoney):
+    with instance.batch():
+        for tx in instance.transactions(booked=True, checked=False):
+            tx.set_checkmark(value=True)
+        # nothing is sent to the backend before the block ends
+        assert list(instance.transactions(booked=True, checked=False))
+    assert not list(instance.transactions(booked=True, checked=False))
+
+def test_repr(instance_ro: MoneyMoney):
+    account = instance_ro.account("Deutsche Bank")
+    assert repr(account) == "<Account name='Deutsche Bank' accountNumber='A1111111111'>"
+    tx = next(iter(instance_ro.transactions(booked=True, checked=False)))
+    assert repr(tx) == "<Transaction id=1001 amount=100>"
+
+def test_to_json_follows_changes(instance: MoneyMoney):
+    tx = next(iter(instance.transactions(booked=True, checked=False)))
+    assert '"checkmark":false' in tx.to_json()
+    tx.set_checkmark(value=True)
+    assert '"checkmark":true' in tx.to_json()
+
+def test_columns(instance_ro: MoneyMoney):
+    columns = instance_ro.columns(["id", "amount"], booked=True)
+    assert columns == {"id": [1001, 2001], "amount": [100, 100], "account": ["Deutsche Bank", "Postbank"]}
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_to_json_keeps_non_ascii(monkeypatch, instance_ro: MoneyMoney, use_orjson):
+    if use_orjson:
+        monkeypatch.setattr(backend_module, "orjson", pytest.importorskip("orjson"))
+    else:
+        monkeypatch.setattr(backend_module, "orjson", None)
+    account = instance_ro.account("Deutsche Bank")
+    assert account is not None
+    tx = Transaction(account, {"name": "Bäckerei", "bookingDate": datetime.datetime(2023, 1, 2)})
+    assert tx.to_json() == '{"name":"Bäckerei","bookingDate":"2023-01-02"}'
@@ -0,0 +1,236 @@
+""" unit tests for the AppleScript backend
+"""
+
+import concurrent.futures
+import datetime
+import plistlib
+import sys
+import time
+from typing import List
+
+import pytest
+
+from money import MoneyMoney
+from money.backends import MoneyMoney as backend_module
+from money.backends.MoneyMoney import Backend
+from money.utils import AppleScriptException
+
+
+class ScriptedBackend(Backend):
+    """ Backend which answers AppleScript calls with canned plist data."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scripts: List[str] = []
+        self.bulk_fails = False
+
+    def run_apple_script(self, script: str) -> bytes:
+        self.scripts.append(script)
+        if "repeat with acc" in script:
+            if self.bulk_fails:
+                raise AppleScriptException("bulk export failed")
+            export = plistlib.dumps({"transactions": [{"id": 1, "amount": 10, "checkmark": False}]})
+            return (export + b"\x1e") * script.count('"A') + b"\n"
+        if "export accounts" in script:
+            return plistlib.dumps([{"name": "Girokonto", "accountNumber": "A1", "portfolio": False}])
+        if "export transactions" in script:
+            return plistlib.dumps({"transactions": [{"id": 1, "amount": 10, "checkmark": False}]})
+        if "fail" in script:
+            raise AppleScriptException("set failed")
+        if "export portfolio" in script:
+            return plistlib.dumps({"portfolio": [{"name": "Apple"}]})
+        return b""
+
+    def run_apple_script_plist(self, script: str):
+        return self.load_plist(self.run_apple_script(script))
+
+    def run_apple_script_plist_items(self, script: str, key: str):
+        yield from self.run_apple_script_plist(script).get(key, [])
+
+
+START = datetime.date(2023, 1, 1)
+
+
+def test_exports_are_cached():
+    backend = ScriptedBackend()
+    assert backend.get_accounts() == backend.get_accounts()
+    assert backend.get_transactions("A1", START, None) == backend.get_transactions("A1", START, None)
+    assert backend.get_positions("P1") == backend.get_positions("P1")
+    assert len(backend.scripts) == 3
+
+
+def test_cache_is_keyed_by_date_range():
+    backend = ScriptedBackend()
+    backend.get_transactions("A1", START, None)
+    backend.get_transactions("A1", START, datetime.date(2023, 2, 1))
+    assert len(backend.scripts) == 2
+
+
+def test_cache_can_be_disabled():
+    backend = ScriptedBackend(cache_ttl=0)
+    backend.get_accounts()
+    backend.get_accounts()
+    assert len(backend.scripts) == 2
+
+
+def test_transactions_are_streamed_without_cache():
+    backend = ScriptedBackend(cache_ttl=0)
+    tx_data = backend.iter_transactions("A1", START, None)
+    assert not backend.scripts
+    assert list(tx_data) == [{"id": 1, "amount": 10, "checkmark": False}]
+    assert len(backend.scripts) == 1
+    # get_transactions always returns a list
+    assert backend.get_transactions("A1", START, None) == [{"id": 1, "amount": 10, "checkmark": False}]
+
+
+def test_accounts_are_cached_on_disk(monkeypatch, tmp_path):
+    monkeypatch.setenv("MM_ACCOUNT_CACHE_TTL", "60")
+    monkeypatch.setattr(Backend, "ACCOUNT_CACHE_DIR", str(tmp_path))
+    first, second = ScriptedBackend(), ScriptedBackend()
+    assert first.get_accounts() == second.get_accounts()
+    assert len(first.scripts) == 1 and not second.scripts
+    second.invalidate("accounts")
+    second.get_accounts()
+    assert len(second.scripts) == 1
+
+
+def test_malformed_account_cache_ttl_disables_the_cache(monkeypatch):
+    monkeypatch.setenv("MM_ACCOUNT_CACHE_TTL", "1h")
+    assert ScriptedBackend().account_cache_ttl == 0
+
+
+def test_invalidate():
+    backend = ScriptedBackend()
+    backend.get_accounts()
+    backend.get_transactions("A1", START, None)
+    backend.invalidate("transactions")
+    backend.get_accounts()
+    backend.get_transactions("A1", START, None)
+    assert len(backend.scripts) == 3
+    backend.invalidate()
+    backend.get_accounts()
+    assert len(backend.scripts) == 4
+
+
+def test_bulk_export_uses_a_single_script():
+    backend = ScriptedBackend()
+    res = backend.get_transactions_bulk(["A1", "A2"], START, None)
+    assert list(res) == ["A1", "A2"]
+    assert res["A1"][0]["id"] == 1
+    assert len(backend.scripts) == 1
+    # the bulk export fills the per account cache
+    backend.get_transactions("A2", START, None)
+    assert len(backend.scripts) == 1
+
+
+def test_bulk_export_falls_back_to_single_exports():
+    backend = ScriptedBackend()
+    backend.bulk_fails = True
+    res = backend.get_transactions_bulk(["A1", "A2"], START, None)
+    assert list(res) == ["A1", "A2"]
+    assert len(backend.scripts) == 3
+
+
+def test_bulk_fallback_from_several_threads():
+    # a short ttl makes every put sweep expired entries while the other workers put theirs
+    backend = ScriptedBackend(cache_ttl=1e-4)
+    backend.bulk_fails = True
+    accounts = [f"A{i}" for i in range(40)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: backend.get_transactions_bulk(accounts, START, None), range(50)))
+    finally:
+        sys.setswitchinterval(interval)
+    assert all(list(res) == accounts for res in results)
+
+
+def test_date_format():
+    backend = ScriptedBackend()
+    backend.get_transactions("A1", datetime.date(2023, 3, 4), datetime.date(2023, 12, 24))
+    assert 'from date "04/03/2023" to date "24/12/2023"' in backend.scripts[0]
+
+
+def test_bulk_export_of_several_accounts_is_parsed():
+    backend = ScriptedBackend()
+    res = backend.get_transactions_bulk(["A1", "A2", "A3"], START, None)
+    assert [tx_data[0]["id"] for tx_data in res.values()] == [1, 1, 1]
+
+
+def test_set_transaction_field_updates_the_cache():
+    backend = ScriptedBackend()
+    backend.get_transactions("A1", START, None)
+    backend.set_transaction_field(1, "checkmark", "on")
+    assert backend.get_transactions("A1", START, None)[0]["checkmark"] is True
+    assert len(backend.scripts) == 2
+
+
+def test_expired_exports_are_dropped(monkeypatch):
+    backend = ScriptedBackend()
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    backend.get_transactions("A1", START, None)
+    now[0] += backend.cache_ttl
+    backend.get_transactions("A1", START, datetime.date(2023, 2, 1))
+    backend.get_transactions("A1", START, None)
+    # only the two live exports are cached and indexed
+    assert len(backend._cache) == 2  # pylint: disable=protected-access
+    assert len(backend._transactions_by_id[1]) == 2  # pylint: disable=protected-access
+
+
+def test_prefetch_transactions():
+    backend = ScriptedBackend()
+    instance = MoneyMoney(backend=backend)
+    instance.prefetch_transactions(age=30)
+    exports = len(backend.scripts)
+    for account in instance.accounts():
+        assert list(account.transactions(age=30))
+    assert len(backend.scripts) == exports
+
+
+def test_batch_sends_a_single_script():
+    backend = ScriptedBackend()
+    backend.get_transactions("A1", START, None)
+    with backend.batch():
+        backend.update_transaction_fields(1, {"checkmark": "on"})
+        backend.update_transaction_fields(1, {"comment": "<tag:x>"})
+        backend.update_transaction_fields(2, {"checkmark": "on"})
+        assert len(backend.scripts) == 1
+    assert len(backend.scripts) == 2
+    assert ('set transaction id 1 checkmark to "on"\n'
+            'set transaction id 1 comment to "<tag:x>"\n'
+            'set transaction id 2 checkmark to "on"') in backend.scripts[1]
+    assert backend.get_transactions("A1", START, None)[0]["comment"] == "<tag:x>"
+
+
+def test_instances_do_not_share_the_default_backend(monkeypatch):
+    monkeypatch.setattr(backend_module, "Backend", ScriptedBackend)
+    first, second = MoneyMoney(), MoneyMoney()
+    assert first._backend is not second._backend  # pylint: disable=protected-access
+
+
+def test_set_field_values_are_escaped():
+    backend = ScriptedBackend()
+    backend.set_transactions_fields({1: {"comment": 'say "hi" \\o/'}, 2: {"checkmark": "on"}})
+    assert 'set transaction id 1 comment to "say \\"hi\\" \\\\o/"' in backend.scripts[0]
+
+
+def test_batch_is_dropped_on_error():
+    backend = ScriptedBackend()
+    with pytest.raises(RuntimeError):
+        with backend.batch():
+            backend.update_transaction_fields(1, {"checkmark": "on"})
+            raise RuntimeError("stop")
+    assert not backend.scripts
+    backend.update_transaction_fields(1, {"checkmark": "on"})
+    assert len(backend.scripts) == 1
+
+
+def test_failed_batch_update_invalidates_the_cache():
+    backend = ScriptedBackend()
+    backend.get_transactions("A1", START, None)
+    with pytest.raises(AppleScriptException):
+        backend.set_transactions_fields({1: {"checkmark": "on"}, 2: {"comment": "fail"}})
+    # the first statement may be applied, so the transactions are exported again
+    backend.get_transactions("A1", START, None)
+    assert len(backend.scripts) == 3
@@ -0,0 +1,28 @@
+""" unit tests for the parser of AppleScript results
+"""
+
+import pytest
+
+from money import _osa_parse
+
+
+@pytest.mark.parametrize("text, value", [
+    ('"hello"', "hello"),
+    ('"say \\"hi\\"\\nback\\\\slash"', 'say "hi"\nback\\slash'),
+    ("42", 42),
+    ("-1.5", -1.5),
+    ("true", True),
+    ("missing value", None),
+    ("{}", []),
+    ('{1, "a", {true, false}}', [1, "a", [True, False]]),
+    ('{name:"Girokonto", balance:{12.5, "EUR"}, |account number|:"A1"}',
+     {"name": "Girokonto", "balance": [12.5, "EUR"], "account number": "A1"}),
+])
+def test_loads(text, value):
+    assert _osa_parse.loads(text) == value
+
+
+@pytest.mark.parametrize("text", ['"open', "{1, 2", "{a:1, 2}", "transaction id 1", '"a" "b"', ""])
+def test_loads_rejects(text):
+    with pytest.raises(ValueError):
+        _osa_parse.loads(text)
@@ -0,0 +1,52 @@
+""" unit tests for the lxml based plist parser
+"""
+
+import datetime
+import io
+import plistlib
+
+import pytest
+
+from money import _plist
+
+DATA = {
+    "transactions": [
+        {
+            "id": 1001,
+            "amount": -12.5,
+            "booked": True,
+            "checkmark": False,
+            "name": "Bäckerei <Müller> & Söhne",
+            "bookingDate": datetime.datetime(2023, 1, 31, 12, 0, 0),
+            "purpose": "",
+            "raw": b"\x00\x01",
+            "tags": [],
+            "nested": {"empty": {}, "list": [1, "two", 3.0]},
+        },
+    ],
+    "creator": "MoneyMoney",
+}
+
+
+@pytest.mark.parametrize("use_lxml", [True, False])
+def test_loads_matches_plistlib(monkeypatch, use_lxml):
+    if use_lxml:
+        pytest.importorskip("lxml")
+    else:
+        monkeypatch.setattr(_plist, "etree", None)
+    assert _plist.loads(plistlib.dumps(DATA)) == DATA
+
+
+def test_top_level_array():
+    assert _plist.loads(plistlib.dumps([{"name": "Girokonto"}])) == [{"name": "Girokonto"}]
+
+
+@pytest.mark.parametrize("use_lxml", [True, False])
+def test_iterload(monkeypatch, use_lxml):
+    if use_lxml:
+        pytest.importorskip("lxml")
+    else:
+        monkeypatch.setattr(_plist, "etree", None)
+    items = _plist.iterload(io.BytesIO(plistlib.dumps(DATA)), "transactions")
+    assert list(items) == DATA["transactions"]
+    assert not list(_plist.iterload(io.BytesIO(plistlib.dumps(DATA)), "missing"))
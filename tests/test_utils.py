@@ -0,0 +1,138 @@
+""" unit tests for the osascript helpers
+"""
+
+import plistlib
+import sys
+
+import pytest
+
+from money import utils
+
+# stands in for osascript: echo the script back, fail if it contains "error",
+# log a lot to stderr for "noisy" and hang for "hang"
+FAKE_OSASCRIPT = [
+    sys.executable, "-c", """
+import sys, time
+s = sys.stdin.buffer.read()
+if b"hang" in s:
+    time.sleep(30)
+if b"noisy" in s:
+    sys.stderr.write("log line\\n" * 20000)
+if b"error" in s:
+    sys.stderr.write("failed")
+    sys.exit(1)
+sys.stdout.buffer.write(s)
+""",
+]
+
+# stands in for osascript -i -s s: echo each line as result in source form, log to stderr, fail on "error"
+FAKE_OSASCRIPT_SESSION = [
+    sys.executable, "-u", "-c", """
+import sys
+for line in sys.stdin:
+    line = line.rstrip("\\n")
+    if line.startswith("log "):
+        sys.stderr.write("(*" + line[5:-1] + "*)\\n")
+    elif "error" in line:
+        sys.stderr.write("execution error: " + line + "\\n")
+    else:
+        sys.stdout.write("=> " + line + "\\n")
+""",
+]
+
+
+@pytest.fixture(autouse=True)
+def fake_osascript(monkeypatch):
+    monkeypatch.setattr(utils, "OSASCRIPT_COMMAND", FAKE_OSASCRIPT)
+    monkeypatch.setattr(utils, "OSASCRIPT_SESSION_COMMAND", FAKE_OSASCRIPT_SESSION)
+
+
+def test_applescript():
+    assert utils.applescript("hello") == b"hello"
+
+
+def test_applescript_failure():
+    with pytest.raises(utils.AppleScriptException, match="failed"):
+        utils.applescript("error")
+
+
+def test_applescript_plist():
+    data = {"transactions": [{"id": 1, "amount": 1.5}]}
+    assert utils.applescript_plist(plistlib.dumps(data).decode("utf-8")) == data
+
+
+def test_applescript_plist_items():
+    data = {"account": "A1", "transactions": [{"id": 1}, {"id": 2}]}
+    items = utils.applescript_plist_items(plistlib.dumps(data).decode("utf-8"), "transactions")
+    assert next(items) == {"id": 1}
+    assert list(items) == [{"id": 2}]
+    with pytest.raises(utils.AppleScriptException, match="failed"):
+        list(utils.applescript_plist_items("error", "transactions"))
+
+
+def test_applescript_plist_failure():
+    with pytest.raises(utils.AppleScriptException, match="failed"):
+        utils.applescript_plist("error")
+
+
+def test_stderr_does_not_block():
+    data = plistlib.dumps({"noisy": True}).decode("utf-8")
+    assert utils.applescript(data) == data.encode("utf-8")
+    assert utils.applescript_plist(data) == {"noisy": True}
+    assert not list(utils.applescript_plist_items(data, "transactions"))
+
+
+def test_timeout(monkeypatch):
+    monkeypatch.setattr(utils, "OSASCRIPT_TIMEOUT", 0.5)
+    data = plistlib.dumps({"hang": True}).decode("utf-8")
+    with pytest.raises(utils.AppleScriptException, match="timed out after 0.5s"):
+        utils.applescript(data)
+    with pytest.raises(utils.AppleScriptException, match="timed out"):
+        utils.applescript_plist(data)
+    with pytest.raises(utils.AppleScriptException, match="timed out"):
+        list(utils.applescript_plist_items(data, "transactions"))
+
+
+def test_output_is_bounded(monkeypatch):
+    monkeypatch.setattr(utils, "MAX_OUTPUT_BYTES", 100)
+    data = plistlib.dumps({"transactions": [{"id": i} for i in range(100)]}).decode("utf-8")
+    with pytest.raises(utils.AppleScriptException, match="exceeds"):
+        utils.applescript(data)
+    with pytest.raises(utils.AppleScriptException, match="exceeds"):
+        utils.applescript_plist(data)
+
+
+def test_session():
+    session = utils.OsascriptSession()
+    try:
+        assert session.run('"hello"') == b"hello\n"
+        with pytest.raises(utils.AppleScriptException, match="execution error"):
+            session.run("error")
+        # the session survives errors
+        assert session.run('"world"') == b"world\n"
+        # string results are unquoted, even if they contain escaped line breaks
+        assert session.run('"a\\n=> b"') == b"a\n=> b\n"
+        assert session.run("{1, 2}") == b"{1, 2}\n"
+    finally:
+        session.close()
+
+
+def test_applescript_in_shared_session(monkeypatch):
+    monkeypatch.setattr(utils, "PERSISTENT_OSASCRIPT", True)
+    session = utils.shared_session()
+    try:
+        assert utils.applescript('"hello"') == b"hello\n"
+        assert utils.shared_session() is session
+    finally:
+        session.close()
+
+
+def test_plist_helpers_in_shared_session(monkeypatch):
+    monkeypatch.setattr(utils, "PERSISTENT_OSASCRIPT", True)
+    # the fake session only unquotes the result, a fresh osascript would echo the quotes
+    cmd = '"<plist><dict><key>transactions</key><array><integer>1</integer></array></dict></plist>"'
+    try:
+        assert utils.applescript_plist(cmd) == {"transactions": [1]}
+        assert list(utils.applescript_plist_items(cmd, "transactions")) == [1]
+    finally:
+        utils.shared_session().close()